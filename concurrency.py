@@ -1,31 +1,63 @@
 import socket
 import threading
-import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import uuid
 import time
+import msgpack
 import netifaces
-import gzip
-import base64
-from crdt import RgaCrdt, HEAD
+import zlib
+from crdt import RgaCrdt, HEAD, id_counter, make_id, run_ids
 from PyQt6.QtWidgets import (
-    QTextEdit,
+    QPlainTextEdit,
     QMessageBox,
     QApplication,
+    QMenu,
 )
 from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtGui import QInputMethodEvent, QKeySequence, QTextCursor
 from editor import BaseTextEditor
+from udp import send_datagrams
+
+# Longest text carried by one CRDT_INSERT_RUN, keeps datagrams under the MTU.
+MAX_RUN_CHARS = 100
+# How long consecutive keystrokes are coalesced into one run before sending.
+RUN_FLUSH_MS = 40
+
+# Most queued sends the tx thread encodes and hands to the kernel at once.
+TX_BATCH = 64
+
+# Snapshots favour speed over ratio; they are sent rarely but can be large.
+SNAPSHOT_ZLIB_LEVEL = 1
+
+# State checks back off while the document is idle and snap back on activity.
+STATE_CHECK_MIN_MS = 3000
+STATE_CHECK_MAX_MS = 30000
+
+# Per-call non-blocking recv flag (Linux, macOS); 0 where the platform lacks it.
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+# Interfaces rarely change during a session, so the netifaces walk is cached.
+LOCAL_IPS_TTL = 30.0
+_ips_cache = (0.0, None)
 
 
 def get_all_local_ips():
     """
     Retrieve all local IPv4 addresses and their broadcast addresses.
 
-    Ignores loopback and link-local addresses.
+    Ignores loopback and link-local addresses. The result is cached for
+    LOCAL_IPS_TTL seconds.
 
     Returns:
         dict: Keys are local IP addresses, values are broadcast addresses.
     """
+    global _ips_cache
+    cached_at, cached_ips = _ips_cache
+    if cached_ips is not None and time.time() - cached_at < LOCAL_IPS_TTL:
+        return cached_ips
+
     ips = dict()
     try:
         for iface in netifaces.interfaces():
@@ -39,9 +71,95 @@ def get_all_local_ips():
             raise Exception("No multiuser work enabled, check your internet connection")
     except Exception as e:
         print(e)
+    if ips:
+        _ips_cache = (time.time(), ips)
     return ips
 
 
+def get_broadcast_addrs(port):
+    """
+    Return the (broadcast, port) destinations of all local interfaces.
+
+    Interfaces without a broadcast address are skipped.
+
+    Args:
+        port (int): Destination UDP port.
+
+    Returns:
+        list: Address tuples ready to pass to ``socket.sendto``.
+    """
+    return [(bcast, port) for bcast in get_all_local_ips().values() if bcast]
+
+
+def decode_payload(data):
+    """
+    Undo snapshot compression, dispatching on the stream's magic bytes.
+
+    zlib streams start with 0x78, which cannot begin a msgpack map, so
+    uncompressed datagrams pass through untouched.
+    """
+    if data[:1] == b"\x78":
+        return zlib.decompress(data)
+    return data
+
+
+def encode_message(msg):
+    """Serialize a message dict for the wire (msgpack)."""
+    return msgpack.packb(msg, use_bin_type=True)
+
+
+def decode_message(data):
+    """
+    Deserialize a datagram produced by encode_message.
+
+    Only msgpack is understood: the wire format (packed integer node ids,
+    insert runs, zlib snapshots) is incompatible with earlier JSON builds.
+    """
+    data = decode_payload(data)
+    return msgpack.unpackb(data, raw=False)
+
+
+def text_diff(old, new):
+    """
+    Find the single contiguous edit that turns `old` into `new`.
+
+    The common prefix and suffix are found by binary search over slice
+    comparisons, so the scanning happens in C rather than per character.
+
+    Returns:
+        tuple: (start, removed, inserted) - offset of the edit, the slice of
+        `old` that is replaced and the slice of `new` that replaces it.
+    """
+    limit = min(len(old), len(new))
+
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[:mid] == new[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = lo
+
+    lo, hi = 0, limit - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[len(old) - mid :] == new[len(new) - mid :]:
+            lo = mid
+        else:
+            hi = mid - 1
+    suffix = lo
+
+    return prefix, old[prefix : len(old) - suffix], new[prefix : len(new) - suffix]
+
+
+def utf16_len(text):
+    """Return the length of `text` in UTF-16 code units (Qt's text positions)."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
 class ConcurrentTextEditor(BaseTextEditor):
     """
     A PyQt6-based concurrent text editor with CRDT and UDP file sharing support.
@@ -52,11 +170,12 @@ class ConcurrentTextEditor(BaseTextEditor):
     Attributes:
         user (User): Network configuration object for sending/listening UDP messages.
         client_id (str): Unique identifier of this client.
+        site_id (int): client_id as the site number packed into CRDT node ids.
         user_name (str): Name of this user (defaults to client_id).
         peers (dict): Dictionary of connected peers.
         crdt_counter (int): Counter for CRDT operations.
         applying_remote (bool): Flag to avoid broadcasting remote changes.
-        text (QTextEdit): Main text editing widget.
+        text (QPlainTextEdit): Main text editing widget.
     """
 
     message_received = pyqtSignal(dict, tuple)
@@ -72,34 +191,93 @@ class ConcurrentTextEditor(BaseTextEditor):
 
         self.user = User(port_listen_=5005, port_send_=5010)
         self.client_id = str(uuid.uuid4())[:8]
+        # The 8 hex digits of client_id double as the 32-bit site number in node ids.
+        self.site_id = int(self.client_id, 16)
         self.user_name = socket.gethostname()
         self.peers = {}
         self.crdt_counter = 0
         self.applying_remote = False
         self.crdt = RgaCrdt()
-        self.pending_ops = []
+        # Buffered remote ops, keyed by the node id they are waiting for.
+        self.pending_ops = {}
         self.cursor_node = HEAD
         self.chunk_buffer = {}
+        self._send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._send_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        # Outgoing ops and snapshots are encoded and sent on a dedicated thread.
+        self._tx_queue = queue.SimpleQueue()
+        self._tx_thread = threading.Thread(target=self._tx_loop, daemon=True)
+        self._tx_thread.start()
+        # Snapshots are serialized and compressed on their own worker so a
+        # large one never holds up ops waiting in the tx queue.
+        self._snapshot_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+        self._pending_run = None
+        self._run_timer = QTimer(self)
+        self._run_timer.setSingleShot(True)
+        self._run_timer.setInterval(RUN_FLUSH_MS)
+        self._run_timer.timeout.connect(self._flush_insert_run)
 
         self.is_dirty = False
-
-        self.get_shared_file()
-
+        self._clipboard = QApplication.clipboard()
+
+        # Start listening once the event loop runs, after the window's first paint.
+        QTimer.singleShot(0, self.get_shared_file)
+
+        self._last_checked_version = None
+        self._synced_state = None
+        # Remote ops arriving in one event-loop pass share a single widget update.
+        self._sync_scheduled = False
+        self._scheduled_splice = None
+        # Messages that arrive while a file is being loaded, replayed afterwards.
+        self._held_messages = []
+        # Bumped on every document change, so syncs can tell if the widget moved.
+        self._doc_revision = 0
+        # _doc_revision as of the last time the widget was made to match the
+        # CRDT; if it has moved since, something edited the widget directly.
+        self._widget_revision = 0
+        self._doc.contentsChanged.connect(self._on_doc_changed)
         self.consistency_timer = QTimer(self)
         self.consistency_timer.timeout.connect(self._broadcast_state_check)
-        self.consistency_timer.start(3000)
+        self.consistency_timer.start(STATE_CHECK_MIN_MS)
 
         self.text.keyPressEvent = self._on_key
+        # Every change reaches the widget as a programmatic splice, and Qt's
+        # undo would rewind the widget behind the CRDT's back, so it is off.
+        self.text.setUndoRedoEnabled(False)
+        # Qt's own editing paths would bypass the CRDT: drops are refused and
+        # the context menu is replaced by one that goes through it.
+        self.text.setAcceptDrops(False)
+        self.text.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.text.customContextMenuRequested.connect(self._show_context_menu)
 
         self.text.cursorPositionChanged.connect(self._on_cursor_changed)
         self.text.installEventFilter(self)
 
+    def _load_text(self, content):
+        """Load `content`, then apply the remote updates held back meanwhile."""
+        try:
+            super()._load_text(content)
+        finally:
+            held, self._held_messages = self._held_messages, []
+            for msg, addr in held:
+                self._handle_message(msg, addr)
+            self._run_scheduled_sync()
+
+    def _on_doc_changed(self):
+        self._doc_revision += 1
+
     def _on_cursor_changed(self):
         """Update cursor_node when cursor position changes (click, navigation)."""
         if not self.applying_remote:
             self._update_cursor_node_from_position()
 
     def _apply_snapshot(self, msg):
+        if msg.get("partial"):
+            self._merge_snapshot(msg)
+            return
+
+        # A splice queued against the old state no longer applies.
+        self._scheduled_splice = None
         self.applying_remote = True
         try:
             crdt_state = msg.get("crdt_state")
@@ -108,26 +286,23 @@ class ConcurrentTextEditor(BaseTextEditor):
                 new_crdt = RgaCrdt.from_dict(crdt_state)
 
                 self.crdt = new_crdt
+                self._last_checked_version = None
+                self._synced_state = None
+                # Ops that overtook the snapshot were buffered; replay the
+                # ones it makes applicable and keep the rest waiting.
+                self._flush_pending_ops()
                 rendered = self.crdt.render()
                 print(
                     f"[CRDT] SNAPSHOT RECEIVED: {len(crdt_state.get('nodes', []))} nodes"
                 )
 
-                max_counter = self.crdt_counter
-                for node in self.crdt.nodes.keys():
-                    if (
-                        isinstance(node, tuple)
-                        and len(node) == 2
-                        and isinstance(node[0], int)
-                    ):
-                        if node[0] > max_counter:
-                            max_counter = node[0]
-                self._update_lamport_clock(max_counter)
+                self._update_lamport_clock(self.crdt.max_counter)
 
-                self.text.setPlainText(rendered)
+                with self._no_undo():
+                    self._apply_text_diff(self.text.toPlainText(), rendered)
+                self._widget_revision = self._doc_revision
 
-                self.pending_ops.clear()
-                self.is_dirty = False
+                self._mark_clean()
 
                 if self.cursor_node != HEAD and self.cursor_node not in self.crdt.nodes:
                     print(
@@ -157,22 +332,46 @@ class ConcurrentTextEditor(BaseTextEditor):
 
                 new_pos = self._get_cursor_position_from_node()
                 cursor = self.text.textCursor()
-                cursor.setPosition(min(new_pos, len(self.text.toPlainText())))
+                cursor.setPosition(min(new_pos, len(rendered)))
                 self.text.setTextCursor(cursor)
 
             else:
                 text = msg.get("text", "")
                 print(f"[CRDT] SNAPSHOT RECEIVED (old style): text='{text[:50]}...'")
-                self.text.setPlainText(text)
+                with self._no_undo():
+                    self.text.setPlainText(text)
                 self.crdt = RgaCrdt()
+                self._last_checked_version = None
+                self._synced_state = None
                 self.pending_ops.clear()
-                self.is_dirty = False
+                self._mark_clean()
 
                 self.cursor_node = HEAD
 
         finally:
             self.applying_remote = False
 
+    def _merge_snapshot(self, msg):
+        """Merge a partial snapshot (diverging hash buckets) into the local CRDT."""
+        crdt_state = msg.get("crdt_state") or {}
+        orphans = self.crdt.merge_dict(crdt_state)
+        print(
+            f"[CRDT] PARTIAL SNAPSHOT RECEIVED: {len(crdt_state.get('nodes', []))} nodes, {len(orphans)} pending"
+        )
+
+        for node_data in orphans:
+            node_id = node_data["id"]
+            text = node_data["text"]
+            after = node_data["after"]
+            self._defer_op(after, ("insert", after, node_id, text))
+            if node_data["deleted"]:
+                for char_id in run_ids(node_id, len(text)):
+                    self._defer_op(char_id, ("delete", char_id))
+
+        self._update_lamport_clock(self.crdt.max_counter)
+        self._flush_pending_ops()
+        self._schedule_sync()
+
     def _handle_invite(self, msg, addr):
         if msg.get("from_id") == self.client_id:
             return
@@ -222,9 +421,8 @@ class ConcurrentTextEditor(BaseTextEditor):
                 "listen_port": self.user.port_listen,
             }
 
-            payload = json.dumps(response).encode("utf-8")
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                sock.sendto(payload, (peer_ip, peer_port))
+            payload = encode_message(response)
+            self._send_sock.sendto(payload, (peer_ip, peer_port))
 
         from PyQt6.QtCore import QTimer
 
@@ -265,6 +463,11 @@ class ConcurrentTextEditor(BaseTextEditor):
         if msg.get("from_id") == self.client_id:
             return
 
+        # _load_text spins the event loop; the document is only half there.
+        if self._loading:
+            self._held_messages.append((msg, addr))
+            return
+
         msg_type = msg.get("type")
 
         if msg_type == "CHUNK":
@@ -283,7 +486,7 @@ class ConcurrentTextEditor(BaseTextEditor):
         elif msg_type == "PEER_LEAVE":
             self._handle_peer_leave(msg)
 
-        elif msg_type == "CRDT_INSERT":
+        elif msg_type == "CRDT_INSERT_RUN":
             self._apply_remote_insert(msg)
 
         elif msg_type == "CRDT_DELETE":
@@ -294,25 +497,32 @@ class ConcurrentTextEditor(BaseTextEditor):
         elif msg_type == "STATE_CHECK":
             self._handle_state_check(msg, addr)
 
+        elif msg_type == "STATE_DIGESTS":
+            self._handle_state_digests(msg)
+
         elif msg_type == "REQUEST_SNAPSHOT":
-            self._send_snapshot_to_peer(msg.get("from_id"))
+            vv = msg.get("vv")
+            self._send_snapshot_to_peer(
+                msg.get("from_id"),
+                self._diverging_buckets(msg.get("buckets")),
+                since=dict(vv) if vv is not None else None,
+            )
 
     def _handle_chunk(self, msg, addr):
         """Reassemble chunked messages."""
         msg_id = msg.get("id")
         chunk_idx = msg.get("i")
         total_chunks = msg.get("n")
-        data_b64 = msg.get("data")
+        data = msg.get("data")
 
-        if not (msg_id and total_chunks and data_b64 is not None):
+        if not (msg_id and total_chunks and isinstance(data, bytes)):
             return
 
         if msg_id not in self.chunk_buffer:
             self.chunk_buffer[msg_id] = [None] * total_chunks
 
         try:
-            chunk_data = base64.b64decode(data_b64)
-            self.chunk_buffer[msg_id][chunk_idx] = chunk_data
+            self.chunk_buffer[msg_id][chunk_idx] = data
         except Exception as e:
             print(f"[CHUNK] Error decoding chunk: {e}")
             return
@@ -322,13 +532,7 @@ class ConcurrentTextEditor(BaseTextEditor):
             del self.chunk_buffer[msg_id]
 
             try:
-                try:
-                    decompressed = gzip.decompress(full_data)
-                    full_data = decompressed
-                except (gzip.BadGzipFile, OSError):
-                    pass
-
-                full_msg = json.loads(full_data.decode("utf-8"))
+                full_msg = decode_message(full_data)
                 print(f"[CHUNK] Reassembled message {msg_id} ({len(full_data)} bytes)")
 
                 self._handle_message(full_msg, addr)
@@ -384,24 +588,37 @@ class ConcurrentTextEditor(BaseTextEditor):
             "peer_ip": peer_ip,
             "peer_port": peer_port,
         }
-        payload = json.dumps(msg).encode("utf-8")
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-            sock.sendto(payload, (target_ip, target_port))
+        payload = encode_message(msg)
+        self._send_sock.sendto(payload, (target_ip, target_port))
 
     def _add_peer(self, peer_id, ip, port, name):
         self.peers[peer_id] = {
             "ip": ip,
             "port": port,
+            "addr": (ip, port),
             "name": name,
             "last_seen": time.time(),
         }
         print(f"[PEER] Dodano {name} ({ip}:{port})")
 
     def _broadcast_state_check(self):
-        """Periodically broadcast current state hash to detect desynchronization."""
+        """
+        Periodically broadcast current state hash to detect desynchronization.
+
+        While the CRDT has not changed since the previous check, the interval
+        doubles up to STATE_CHECK_MAX_MS.
+        """
         if not self.peers:
             return
 
+        version = self.crdt.version
+        if version == self._last_checked_version:
+            interval = self.consistency_timer.interval()
+            self.consistency_timer.setInterval(min(interval * 2, STATE_CHECK_MAX_MS))
+        else:
+            self._reset_state_check_interval()
+        self._last_checked_version = version
+
         current_hash = self.crdt.state_hash()
         node_count = len(self.crdt.nodes)
 
@@ -413,8 +630,13 @@ class ConcurrentTextEditor(BaseTextEditor):
         }
         self._send_to_peers(msg)
 
+    def _reset_state_check_interval(self):
+        """Return the state check timer to its base interval after activity."""
+        if self.consistency_timer.interval() != STATE_CHECK_MIN_MS:
+            self.consistency_timer.setInterval(STATE_CHECK_MIN_MS)
+
     def _handle_state_check(self, msg, addr):
-        """Handle incoming state check. If divergent, request or send snapshot."""
+        """Handle incoming state check. If divergent, swap bucket digests and maybe request a snapshot."""
         remote_hash = msg.get("state_hash")
         remote_count = msg.get("node_count", 0)
         sender_id = msg.get("from_id")
@@ -428,22 +650,73 @@ class ConcurrentTextEditor(BaseTextEditor):
         if remote_hash == my_hash:
             return
 
+        self._reset_state_check_interval()
         print(
             f"[SYNC] Inconsistency detected with {sender_id}. Me: {my_count} nodes, Them: {remote_count} nodes."
         )
 
-        if my_count > remote_count:
-            print(f"[SYNC] Sending snapshot to {sender_id} (I have more data).")
-            self._send_snapshot_to_peer(sender_id)
-        elif my_count < remote_count:
+        # The check carries only the hash; bucket digests grow with the
+        # document, so they are exchanged (chunked) once a mismatch is seen.
+        self._send_state_digests(sender_id, reply=True)
+        if my_count < remote_count:
             print(f"[SYNC] Requesting snapshot from {sender_id} (They have more data).")
             self._request_snapshot(sender_id)
-        else:
-            if self.client_id > sender_id:
-                print(f"[SYNC] Tie-break: Sending snapshot to {sender_id}.")
-                self._send_snapshot_to_peer(sender_id)
-            else:
-                pass
+
+    def _send_state_digests(self, peer_id, reply):
+        """
+        Send our bucket digests to a peer whose state hash differs from ours.
+
+        Args:
+            peer_id (str): Target peer.
+            reply (bool): Ask the peer to answer with its own digests.
+        """
+        peer = self.peers.get(peer_id)
+        if not peer:
+            return
+
+        msg = {
+            "type": "STATE_DIGESTS",
+            "from_id": self.client_id,
+            "buckets": list(self.crdt.bucket_digests().items()),
+            "reply": reply,
+        }
+        self._snapshot_pool.submit(self._encode_and_send, msg, peer["addr"])
+
+    def _handle_state_digests(self, msg):
+        """Push the buckets that differ from a peer's digests, answering with ours if asked."""
+        sender_id = msg.get("from_id")
+        if sender_id not in self.peers:
+            return
+
+        # Snapshots sent here are merged (set union), so both sides push
+        # their diverging buckets and the exchange converges.
+        diverging = self._diverging_buckets(msg.get("buckets"))
+        if diverging is None or diverging:
+            print(f"[SYNC] Sending diverging buckets {diverging} to {sender_id}.")
+            self._send_snapshot_to_peer(sender_id, diverging)
+        if msg.get("reply"):
+            self._send_state_digests(sender_id, reply=False)
+
+    def _diverging_buckets(self, remote_buckets):
+        """
+        Compare a peer's bucket digests with ours.
+
+        Args:
+            remote_buckets (list | None): [bucket, digest] pairs sent by the peer.
+
+        Returns:
+            list | None: Buckets whose digests differ, or None if the peer
+            did not send any (the full state must be exchanged).
+        """
+        if remote_buckets is None:
+            return None
+        remote = {bucket: digest for bucket, digest in remote_buckets}
+        mine = self.crdt.bucket_digests()
+        return [
+            bucket
+            for bucket in mine.keys() | remote.keys()
+            if mine.get(bucket) != remote.get(bucket)
+        ]
 
     def _request_snapshot(self, peer_id):
         """Send a request for a snapshot to a specific peer."""
@@ -451,12 +724,40 @@ class ConcurrentTextEditor(BaseTextEditor):
         if not peer:
             return
 
-        msg = {"type": "REQUEST_SNAPSHOT", "from_id": self.client_id}
-        payload = json.dumps(msg).encode("utf-8")
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-            sock.sendto(payload, (peer["ip"], peer["port"]))
+        msg = {
+            "type": "REQUEST_SNAPSHOT",
+            "from_id": self.client_id,
+            "buckets": list(self.crdt.bucket_digests().items()),
+            "vv": list(self.crdt.version_vector().items()),
+        }
+        # Sized by the document, so it is compressed and chunked like a snapshot.
+        self._snapshot_pool.submit(self._encode_and_send, msg, peer["addr"])
 
     def get_shared_file(self):
+        def drain(sock):
+            """Block for one datagram, then read whatever else is already queued."""
+            batch = [sock.recvfrom(65535)]
+            if _MSG_DONTWAIT:
+                # Non-blocking reads per call; the socket itself stays blocking.
+                try:
+                    while len(batch) < 64:
+                        batch.append(sock.recvfrom(65535, _MSG_DONTWAIT))
+                except OSError:
+                    # BlockingIOError: queue is empty; anything else is
+                    # reported on the next blocking read.
+                    pass
+                return batch
+
+            sock.setblocking(False)
+            try:
+                while len(batch) < 64:
+                    batch.append(sock.recvfrom(65535))
+            except OSError:
+                pass
+            finally:
+                sock.setblocking(True)
+            return batch
+
         def listen():
             self.auto_select_ip()
             sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -464,20 +765,19 @@ class ConcurrentTextEditor(BaseTextEditor):
             print(f"[UDP] Listening on {self.user.port_listen} ...")
             while True:
                 try:
-                    data, addr = sock.recvfrom(65535)
+                    batch = drain(sock)
+                except Exception as e:
+                    print("[UDP ERROR]", e)
+                    continue
 
+                for data, addr in batch:
                     try:
-                        decompressed = gzip.decompress(data)
-                        data = decompressed
-                    except (gzip.BadGzipFile, OSError):
-                        pass
+                        msg = decode_message(data)
 
-                    msg = json.loads(data.decode("utf-8"))
+                        self.message_received.emit(msg, addr)
 
-                    self.message_received.emit(msg, addr)
-
-                except Exception as e:
-                    print("[UDP ERROR]", e)
+                    except Exception as e:
+                        print("[UDP ERROR]", e)
 
         threading.Thread(target=listen, daemon=True).start()
 
@@ -501,15 +801,12 @@ class ConcurrentTextEditor(BaseTextEditor):
             "from_name": self.user_name,
             "listen_port": self.user.port_listen,
         }
-        payload = json.dumps(msg).encode("utf-8")
-        ips = get_all_local_ips()
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            for ip, bcast in ips.items():
-                try:
-                    sock.sendto(payload, (bcast, self.user.port_listen))
-                except Exception:
-                    pass
+        payload = encode_message(msg)
+        for addr in get_broadcast_addrs(self.user.port_listen):
+            try:
+                self._send_sock.sendto(payload, addr)
+            except Exception:
+                pass
         QMessageBox.information(
             self, "Share", "Inivitation sent. Waiting for responses."
         )
@@ -519,73 +816,150 @@ class ConcurrentTextEditor(BaseTextEditor):
         if self.applying_remote or e is None:
             return
 
-        self._update_cursor_node_from_position()
+        # There is no CRDT-level undo; see __init__.
+        if e.matches(QKeySequence.StandardKey.Undo) or e.matches(QKeySequence.StandardKey.Redo):
+            return
+
+        self._prepare_local_edit()
 
         cursor = self.text.textCursor()
         index = cursor.position()
 
-        if (
-            e.modifiers() & Qt.KeyboardModifier.ControlModifier
-        ) and e.key() == Qt.Key.Key_V:
-            clipboard = QApplication.clipboard()
-            if clipboard:
-                text = clipboard.text()
-                if text:
-                    self._broadcast_insert(index, text)
-                    self._sync_text_from_crdt()
-                    self._move_cursor(self._get_cursor_position_from_node())
+        if e.matches(QKeySequence.StandardKey.Paste):
+            self._paste_local()
+            return
+
+        if e.matches(QKeySequence.StandardKey.Cut):
+            self._cut_local()
             return
 
         if e.key() == Qt.Key.Key_Backspace:
             if cursor.hasSelection():
-                start = cursor.selectionStart()
-                end = cursor.selectionEnd()
-                self._broadcast_delete_range(start, end)
-                self._sync_text_from_crdt()
-                self._move_cursor(self._get_cursor_position_from_node())
-                return
-            else:
-                if index > 0:
-                    self._broadcast_delete(index)
-                    self._sync_text_from_crdt()
-                    self._move_cursor(self._get_cursor_position_from_node())
-                return
+                self._delete_local(cursor.selectionStart(), cursor.selectionEnd())
+            elif index > 0:
+                self._delete_local(index - 1, index)
+            return
 
         elif e.key() == Qt.Key.Key_Delete:
             if cursor.hasSelection():
-                start = cursor.selectionStart()
-                end = cursor.selectionEnd()
-                self._broadcast_delete_range(start, end)
-                self._sync_text_from_crdt()
-                self._move_cursor(self._get_cursor_position_from_node())
-                return
-            else:
-                if index < len(self.text.toPlainText()):
-                    self._broadcast_delete(index + 1)
-                    self._sync_text_from_crdt()
-                    self._move_cursor(self._get_cursor_position_from_node())
-                return
+                self._delete_local(cursor.selectionStart(), cursor.selectionEnd())
+            elif index < self._doc.characterCount() - 1:
+                self._delete_local(index, index + 1)
+            return
 
-        elif e.key() == Qt.Key.Key_Return:
-            self._broadcast_insert(index, "\n")
-            self._sync_text_from_crdt()
-            self._move_cursor(self._get_cursor_position_from_node())
+        elif e.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+            self._insert_local(index, "\n")
             return
 
         elif e.text():
-            if e.text() >= " ":
-                self._broadcast_insert(index, e.text())
-                self._sync_text_from_crdt()
-                self._move_cursor(self._get_cursor_position_from_node())
+            if e.text() >= " " or e.text() == "\t":
+                self._insert_local(index, e.text())
                 return
 
-        QTextEdit.keyPressEvent(self.text, e)
+        revision = self._doc_revision
+        QPlainTextEdit.keyPressEvent(self.text, e)
+        if self._doc_revision != revision:
+            # An edit Qt made on its own; the CRDT text wins.
+            self._sync_text_from_crdt()
         self._update_cursor_node_from_position()
 
-    def next_op_id(self):
-        """Generate a new CRDT operation ID as a tuple (counter, client_id)."""
-        self.crdt_counter += 1
-        return (self.crdt_counter, self.client_id)
+    def _prepare_local_edit(self):
+        """
+        Bring the widget in line with the CRDT and map the cursor onto it.
+
+        Pending remote changes are shown first, and a widget edited behind
+        the CRDT's back is re-synced, so local edits land on the right node.
+        """
+        if self._sync_scheduled:
+            self._run_scheduled_sync()
+        elif self._doc_revision != self._widget_revision:
+            self._sync_text_from_crdt()
+        self._update_cursor_node_from_position()
+
+    def _cut_local(self):
+        """Copy the selection to the clipboard and delete it through the CRDT."""
+        cursor = self.text.textCursor()
+        if cursor.hasSelection():
+            self.text.copy()
+            self._delete_selection_local()
+
+    def _paste_local(self):
+        """Insert the clipboard text at the cursor through the CRDT."""
+        if self._clipboard:
+            text = self._clipboard.text()
+            if text:
+                self._insert_local(self.text.textCursor().position(), text)
+
+    def _delete_selection_local(self):
+        """Delete the selected text through the CRDT."""
+        cursor = self.text.textCursor()
+        if cursor.hasSelection():
+            self._delete_local(cursor.selectionStart(), cursor.selectionEnd())
+
+    def _show_context_menu(self, pos):
+        """
+        Show the editor's context menu.
+
+        Qt's standard menu edits the widget directly; here Cut, Paste and
+        Delete go through the CRDT like the matching keys.
+        """
+        has_selection = self.text.textCursor().hasSelection()
+        menu = QMenu(self.text)
+        for label, edit, enabled in (
+            ("Cut", self._cut_local, has_selection),
+            ("Copy", self.text.copy, has_selection),
+            ("Paste", self._paste_local, bool(self._clipboard.text())),
+            ("Delete", self._delete_selection_local, has_selection),
+            ("Select All", self.text.selectAll, True),
+        ):
+            action = menu.addAction(label)
+            action.setEnabled(enabled)
+            action.triggered.connect(lambda checked=False, edit=edit: self._menu_edit(edit))
+        menu.exec(self.text.mapToGlobal(pos))
+
+    def _menu_edit(self, edit):
+        """Run a context menu action the way _on_key runs a key."""
+        if self.applying_remote:
+            return
+        self._prepare_local_edit()
+        edit()
+
+    def _on_input_method(self, e):
+        """
+        Send text committed by an input method through the CRDT.
+
+        The preedit (text still being composed) is passed on to Qt, which
+        shows it in the layout without adding it to the document.
+        """
+        commit = e.commitString()
+        if commit and not self.applying_remote:
+            self._prepare_local_edit()
+            self._insert_local(self.text.textCursor().position(), commit)
+        QPlainTextEdit.inputMethodEvent(
+            self.text, QInputMethodEvent(e.preeditString(), e.attributes())
+        )
+
+    def _insert_local(self, index, text):
+        """Insert `text` at the cursor as CRDT ops and splice it into the widget."""
+        first_id = self._broadcast_insert(index, text)
+        self._splice_text(self.crdt.text_offset(first_id), "", text)
+
+    def _delete_local(self, start, end):
+        """Delete text offsets [start, end) as CRDT ops and splice them out of the widget."""
+        removed = self.crdt.render()[start:end]
+        if self._broadcast_delete_range(start, end):
+            self._splice_text(start, removed, "")
+
+    def next_op_id(self, count=1):
+        """
+        Generate a new CRDT operation ID packing (counter, site_id).
+
+        Args:
+            count (int): Number of consecutive counters to reserve, e.g. for
+                an insert run. The first reserved ID is returned.
+        """
+        self.crdt_counter += count
+        return make_id(self.crdt_counter - count + 1, self.site_id)
 
     def _update_lamport_clock(self, remote_counter):
         """Update local counter to be at least remote_counter."""
@@ -602,11 +976,11 @@ class ConcurrentTextEditor(BaseTextEditor):
         crdt_text = self.crdt.render()
         if gui_text != crdt_text:
             self.crdt = RgaCrdt()
-            after_id = HEAD
-            for ch in gui_text:
-                node_id = self.next_op_id()
-                self.crdt.apply_insert(after_id, node_id, ch)
-                after_id = node_id
+            self._last_checked_version = None
+            self._synced_state = None
+            if gui_text:
+                first_id = self.next_op_id(len(gui_text))
+                self.crdt.apply_insert_run(HEAD, first_id, gui_text)
 
     def _update_cursor_node_from_position(self):
         """Update cursor_node based on current GUI cursor position."""
@@ -628,9 +1002,10 @@ class ConcurrentTextEditor(BaseTextEditor):
             return 0
         id_map = self._get_visible_id_map()
 
-        for i, node_id in enumerate(id_map):
-            if node_id == self.cursor_node:
-                return i + 1
+        try:
+            return id_map.index(self.cursor_node) + 1
+        except ValueError:
+            pass
 
         current_id = self.cursor_node
         while current_id != HEAD:
@@ -640,160 +1015,420 @@ class ConcurrentTextEditor(BaseTextEditor):
 
             node = self.crdt.nodes[current_id]
             if not node.deleted:
-                for i, visible_id in enumerate(id_map):
-                    if visible_id == current_id:
-                        return i + 1
+                try:
+                    return id_map.index(current_id) + 1
+                except ValueError:
+                    pass
 
             current_id = node.after
 
         return 0
 
     def _broadcast_insert(self, index, text):
-        """Broadcast CRDT insert operations for each character."""
+        """
+        Apply text locally and broadcast it as CRDT insert runs.
 
-        after_id = self.cursor_node
+        Runs hold up to MAX_RUN_CHARS characters. The last run stays pending
+        so that following keystrokes can extend it; it is sent after
+        RUN_FLUSH_MS, when it is full, or before any other outgoing op.
 
-        for ch in text:
-            node_id = self.next_op_id()
-            self.crdt.apply_insert(after_id, node_id, ch)
-            print(f"[CRDT] LOCAL INSERT: '{ch}' node={node_id} after={after_id}")
-            op = {
-                "type": "CRDT_INSERT",
-                "after": list(after_id) if isinstance(after_id, tuple) else after_id,
-                "node_id": list(node_id),
-                "char": ch,
-            }
-            self._send_to_peers(op)
-            after_id = node_id
+        Returns:
+            int: Node id of the first inserted character.
+        """
+
+        self._reset_state_check_interval()
+        after_id = self.cursor_node
+        text_first_id = None
+
+        completed = []
+        for start in range(0, len(text), MAX_RUN_CHARS):
+            run = text[start : start + MAX_RUN_CHARS]
+            first_id = self.next_op_id(len(run))
+            if text_first_id is None:
+                text_first_id = first_id
+            self.crdt.apply_insert_run(after_id, first_id, run)
+            print(f"[CRDT] LOCAL INSERT: '{run}' node={first_id} after={after_id}")
+
+            pending = self._pending_run
+            if pending is not None and self._extends_pending_run(after_id, first_id, run):
+                pending["text"] += run
+            else:
+                if pending is not None:
+                    completed.append(pending)
+                self._pending_run = {
+                    "type": "CRDT_INSERT_RUN",
+                    "after": after_id,
+                    "node_id": first_id,
+                    "text": run,
+                }
+            after_id = make_id(id_counter(first_id) + len(run) - 1, self.site_id)
 
         self.cursor_node = after_id
 
-    def _broadcast_delete(self, index):
-        """Broadcast a CRDT delete operation."""
-        id_map = self._get_visible_id_map()
-        if index < 1 or index > len(id_map):
-            return
-        node_id = id_map[index - 1]
+        if self._pending_run is not None and len(self._pending_run["text"]) >= MAX_RUN_CHARS:
+            completed.append(self._pending_run)
+            self._pending_run = None
+        self._transmit_to_peers(completed)
+
+        if self._pending_run is None:
+            self._run_timer.stop()
+        elif not self._run_timer.isActive():
+            self._run_timer.start()
+        return text_first_id
+
+    def _extends_pending_run(self, after_id, first_id, text):
+        """Check whether an insert directly continues the pending run."""
+        pending = self._pending_run
+        last_counter = id_counter(pending["node_id"]) + len(pending["text"]) - 1
+        return (
+            after_id == make_id(last_counter, self.site_id)
+            and first_id == make_id(last_counter + 1, self.site_id)
+            and len(pending["text"]) + len(text) <= MAX_RUN_CHARS
+        )
 
-        self.cursor_node = id_map[index - 2] if index >= 2 else HEAD
-        self.crdt.apply_delete(node_id)
-        op = {
-            "type": "CRDT_DELETE",
-            "node_id": list(node_id) if isinstance(node_id, tuple) else node_id,
-        }
-        self._send_to_peers(op)
+    def _flush_insert_run(self):
+        """Send the pending insert run, if any."""
+        self._run_timer.stop()
+        run, self._pending_run = self._pending_run, None
+        if run is not None:
+            self._transmit_to_peers([run])
 
     def _broadcast_delete_range(self, start, end):
-        """Broadcast CRDT delete operations for a range of characters."""
+        """
+        Broadcast CRDT delete operations for a range of characters.
+
+        Returns:
+            bool: False if the range is empty or outside the text.
+        """
         id_map = self._get_visible_id_map()
-        if start < 0 or end > len(id_map):
-            return
+        if start < 0 or end > len(id_map) or start >= end:
+            return False
 
+        self._reset_state_check_interval()
         self.cursor_node = id_map[start - 1] if start >= 1 else HEAD
 
-        node_ids = [id_map[i] for i in range(start, end)]
-        for node_id in node_ids:
-            self.crdt.apply_delete(node_id)
-            op = {
-                "type": "CRDT_DELETE",
-                "node_id": list(node_id) if isinstance(node_id, tuple) else node_id,
-            }
-            self._send_to_peers(op)
+        ops = []
+        for node_id in self.crdt.delete_visible_range(start, end):
+            ops.append(
+                {
+                    "type": "CRDT_DELETE",
+                    "node_id": node_id,
+                }
+            )
+        self._send_many_to_peers(ops)
+        return True
 
     def _send_to_peers(self, msg):
         """Send a JSON message via UDP to all connected peers."""
-        payload = json.dumps(msg).encode("utf-8")
-        for peer in self.peers.values():
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                sock.sendto(payload, (peer["ip"], peer["port"]))
+        self._send_many_to_peers([msg])
+
+    def _send_many_to_peers(self, msgs):
+        """
+        Send JSON messages via UDP to all connected peers.
+
+        The pending insert run is sent first so peers see ops in order.
+        """
+        self._flush_insert_run()
+        self._transmit_to_peers(msgs)
+
+    def _transmit_to_peers(self, msgs):
+        """
+        Queue messages for all connected peers on the tx thread.
+
+        The peer addresses are captured here, on the GUI thread that owns
+        the peers table.
+        """
+        if not self.peers or not msgs:
+            return
+        addrs = [peer["addr"] for peer in self.peers.values()]
+        self._tx_queue.put(("ops", msgs, addrs))
+
+    def _tx_loop(self):
+        """
+        Encode and send queued messages (runs on the tx thread).
+
+        Blocks for one queue entry, then takes whatever else is already
+        queued (up to TX_BATCH). Every message is encoded once and all
+        datagrams are handed to the kernel in batches (sendmmsg on Linux).
+        "raw" entries carry datagrams that are already encoded (snapshot
+        chunks from the snapshot worker). Between a peer's "hold" and
+        "release" entries (a snapshot in flight), ops for that peer are
+        kept back and sent right after the snapshot's last chunk.
+        """
+        tx_queue = self._tx_queue
+        holds = {}  # addr -> snapshots in flight
+        held = {}  # addr -> datagrams waiting for them
+        while True:
+            batch = [tx_queue.get()]
+            try:
+                while len(batch) < TX_BATCH:
+                    batch.append(tx_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            datagrams = []
+            try:
+                for item in batch:
+                    if item is None:
+                        send_datagrams(self._send_sock, datagrams)
+                        return
+                    kind, payload, addrs = item
+                    if kind == "hold":
+                        for addr in addrs:
+                            holds[addr] = holds.get(addr, 0) + 1
+                    elif kind == "release":
+                        for addr in addrs:
+                            holds[addr] -= 1
+                            if not holds[addr]:
+                                del holds[addr]
+                                datagrams.extend(held.pop(addr, ()))
+                    elif kind == "raw":
+                        datagrams.extend((data, addr) for addr in addrs for data in payload)
+                    else:
+                        encoded = [encode_message(msg) for msg in payload]
+                        for addr in addrs:
+                            target = held.setdefault(addr, []) if addr in holds else datagrams
+                            target.extend((data, addr) for data in encoded)
+                send_datagrams(self._send_sock, datagrams)
+            except Exception as e:
+                print(f"[UDP] Send error: {e}")
 
     def _apply_remote_insert(self, msg):
-        """Apply a remote insert operation using CRDT."""
-        after = tuple(msg["after"]) if isinstance(msg["after"], list) else msg["after"]
-        node_id = tuple(msg["node_id"])
-        char = msg["char"]
+        """Apply a remote insert run using CRDT."""
+        after = msg["after"]
+        node_id = msg["node_id"]
+        text = msg["text"]
 
-        self._update_lamport_clock(node_id[0])
+        self._update_lamport_clock(id_counter(node_id) + len(text) - 1)
 
-        if self.crdt.apply_insert(after, node_id, char):
-            print(f"[CRDT] INSERT OK: '{char}' node={node_id} after={after}")
-            self._flush_pending_ops()
-            self._sync_text_from_crdt()
+        if not text or self.crdt.has(node_id):
+            return
+
+        if self.crdt.apply_insert_run(after, node_id, text):
+            print(f"[CRDT] INSERT OK: '{text}' node={node_id} after={after}")
+            if self._flush_pending_ops(run_ids(node_id, len(text))):
+                self._schedule_sync()
+            else:
+                self._schedule_sync((node_id, "", text))
         else:
             print(
-                f"[CRDT] INSERT PENDING: '{char}' node={node_id} after={after} (after not found)"
+                f"[CRDT] INSERT PENDING: '{text}' node={node_id} after={after} (after not found)"
             )
-            self.pending_ops.append(("insert", after, node_id, char))
+            self._defer_op(after, ("insert", after, node_id, text))
 
     def _apply_remote_delete(self, msg):
         """Apply a remote delete operation using CRDT."""
-        node_id = tuple(msg["node_id"])
+        node_id = msg["node_id"]
+
+        node = self.crdt.nodes.get(node_id)
+        was_visible = node is not None and not node.deleted
 
         if self.crdt.apply_delete(node_id):
             print(f"[CRDT] DELETE OK: node={node_id}")
-            self._sync_text_from_crdt()
+            if was_visible:
+                self._schedule_sync((node_id, node.text, ""))
         else:
             print(f"[CRDT] DELETE PENDING: node={node_id} (not found)")
-            self.pending_ops.append(("delete", node_id))
+            self._defer_op(node_id, ("delete", node_id))
 
-    def _flush_pending_ops(self):
-        """Try to apply buffered operations that were waiting for dependencies."""
-        if not self.pending_ops:
-            return
+    def _defer_op(self, dependency, op):
+        """Buffer a remote op until the node `dependency` exists."""
+        self.pending_ops.setdefault(dependency, []).append(op)
+
+    def _flush_pending_ops(self, new_ids=None):
+        """
+        Apply buffered operations whose dependency has arrived.
 
-        print(f"[CRDT] Flushing {len(self.pending_ops)} pending ops...")
-        made_progress = True
-        while made_progress:
-            made_progress = False
-            remaining = []
-            for op in self.pending_ops:
+        Only ops waiting on a newly inserted node are looked at, and every
+        insert they perform makes its own ids candidates in turn, so a chain
+        of K out-of-order ops is applied in O(K).
+
+        Args:
+            new_ids (iterable | None): Ids inserted since the last flush. If
+                None, every buffered dependency is checked (e.g. after a
+                snapshot merge).
+
+        Returns:
+            bool: True if at least one buffered operation was applied.
+        """
+        pending = self.pending_ops
+        if not pending:
+            return False
+
+        nodes = self.crdt.nodes
+        if new_ids is None:
+            ready = [dep for dep in pending if dep in nodes]
+        else:
+            ready = [dep for dep in new_ids if dep in pending]
+        if not ready:
+            return False
+
+        print(f"[CRDT] Flushing pending ops for {len(ready)} arrived nodes...")
+        applied_any = False
+        while ready:
+            for op in pending.pop(ready.pop(), ()):
                 if op[0] == "insert":
-                    _, after, node_id, char = op
-                    if self.crdt.apply_insert(after, node_id, char):
-                        print(f"[CRDT] FLUSH INSERT OK: '{char}' node={node_id}")
-                        made_progress = True
-                    else:
-                        remaining.append(op)
+                    _, after, node_id, text = op
+                    if self.crdt.apply_insert_run(after, node_id, text):
+                        print(f"[CRDT] FLUSH INSERT OK: '{text}' node={node_id}")
+                        applied_any = True
+                        ready.extend(i for i in run_ids(node_id, len(text)) if i in pending)
                 elif op[0] == "delete":
                     _, node_id = op
                     if self.crdt.apply_delete(node_id):
                         print(f"[CRDT] FLUSH DELETE OK: node={node_id}")
-                        made_progress = True
-                    else:
-                        remaining.append(op)
-            self.pending_ops = remaining
-        if self.pending_ops:
-            print(f"[CRDT] Still {len(self.pending_ops)} pending ops remaining")
+                        applied_any = True
+        if pending:
+            remaining = sum(len(ops) for ops in pending.values())
+            print(f"[CRDT] Still {remaining} pending ops remaining")
+        return applied_any
+
+    def _schedule_sync(self, splice=None):
+        """
+        Update the widget once the current burst of remote ops is handled.
+
+        The update runs from a zero-delay timer, after the messages already
+        queued on the event loop. A lone change is applied as a splice; if
+        more changes arrive first, a single diff-based sync covers them all.
+
+        Args:
+            splice (tuple | None): (node_id, removed, text) - the first
+                inserted or the deleted node, the text it removed and the
+                text it added - or None if only a full sync can describe
+                the change. The node's text offset is looked up only if
+                the splice is still wanted when the timer fires.
+        """
+        if self._sync_scheduled:
+            self._scheduled_splice = None
+            return
+        self._sync_scheduled = True
+        self._scheduled_splice = splice
+        QTimer.singleShot(0, self._run_scheduled_sync)
+
+    def _run_scheduled_sync(self):
+        """Apply the widget update queued by _schedule_sync, if still pending."""
+        # While loading, the update stays pending and _load_text runs it.
+        if not self._sync_scheduled or self._loading:
+            return
+        self._sync_scheduled = False
+        splice, self._scheduled_splice = self._scheduled_splice, None
+        if splice is not None:
+            node_id, removed, text = splice
+            self._splice_text(self.crdt.text_offset(node_id), removed, text)
+        else:
+            self._sync_text_from_crdt()
 
     def _sync_text_from_crdt(self):
-        """Synchronize QTextEdit content with CRDT state."""
+        """
+        Synchronize QPlainTextEdit content with CRDT state.
+
+        Only the changed range is replaced, so Qt keeps the layout of the
+        untouched blocks instead of rebuilding the whole document. Returns
+        at once if neither the CRDT nor the document changed since the last
+        sync, without rendering or copying the text out of Qt.
+        """
+        # This sync covers any splice still queued by _schedule_sync.
+        self._scheduled_splice = None
+        if self._synced_state == (self.crdt.version, self._doc_revision):
+            return
+
         self.applying_remote = True
         try:
             new_text = self.crdt.render()
             current_text = self.text.toPlainText()
 
             if new_text != current_text:
-                self.text.setPlainText(new_text)
+                self._apply_text_diff(current_text, new_text)
 
                 new_pos = self._get_cursor_position_from_node()
                 cursor = self.text.textCursor()
                 cursor.setPosition(min(new_pos, len(new_text)))
                 self.text.setTextCursor(cursor)
+            self._synced_state = (self.crdt.version, self._doc_revision)
+            self._widget_revision = self._doc_revision
         finally:
             self.applying_remote = False
 
+    def _splice_text(self, start, removed, text):
+        """
+        Replace the `removed` text at CRDT offset `start` with `text` in the widget.
+
+        Edits the document in place so Qt only re-lays out the touched block
+        instead of the whole document. Falls back to a full sync if the
+        widget is out of step with the CRDT, including when it was edited
+        other than by a splice or sync since the last one.
+        """
+        if start < 0 or self._doc_revision != self._widget_revision:
+            self._sync_text_from_crdt()
+            return
+        rendered = self.crdt.render()
+        # For ASCII text CRDT offsets and Qt positions coincide; the check is O(1).
+        qt_start = start if rendered.isascii() else utf16_len(rendered[:start])
+        qt_length = utf16_len(removed)
+        if qt_start + qt_length > self._doc.characterCount() - 1:
+            self._sync_text_from_crdt()
+            return
+
+        self.applying_remote = True
+        try:
+            self._replace_range(qt_start, qt_length, text)
+            self._widget_revision = self._doc_revision
+
+            self._move_cursor(self._get_cursor_position_from_node())
+        finally:
+            self.applying_remote = False
+
+    def _apply_text_diff(self, current_text, new_text):
+        """Turn the widget's `current_text` into `new_text` with one in-place edit."""
+        start, removed, inserted = text_diff(current_text, new_text)
+        if removed or inserted:
+            self._replace_range(utf16_len(current_text[:start]), utf16_len(removed), inserted)
+
+    def _replace_range(self, start, length, text):
+        """
+        Replace `length` UTF-16 units at document position `start` with `text`.
+
+        Used for remote and CRDT-driven edits, which never record undo steps.
+        """
+        cursor = self._cursor
+        with self._no_undo():
+            cursor.beginEditBlock()
+            cursor.setPosition(start)
+            cursor.setPosition(start + length, QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(text)
+            cursor.endEditBlock()
+
     def _move_cursor(self, position):
         """Move cursor to specified position."""
         cursor = self.text.textCursor()
-        cursor.setPosition(min(position, len(self.text.toPlainText())))
+        cursor.setPosition(min(position, self._doc.characterCount() - 1))
         self.text.setTextCursor(cursor)
 
-    def _send_snapshot_to_peer(self, peer_id):
+    def _send_snapshot_to_peer(self, peer_id, buckets=None, since=None):
+        """
+        Send the CRDT state to a peer.
+
+        The state is captured on the GUI thread; encoding, compression and
+        fragmentation happen on the snapshot worker, which feeds the
+        resulting datagrams to the tx thread.
+
+        Args:
+            peer_id (str): Target peer.
+            buckets (list | None): If given, only nodes in these hash buckets
+                are sent and the receiver merges them instead of replacing
+                its state.
+            since (dict | None): The peer's version vector. If given, only
+                nodes it has not seen (plus tombstones) are sent, merged
+                like a partial snapshot.
+        """
         peer = self.peers.get(peer_id)
         if not peer:
             return
 
-        crdt_dict = self.crdt.to_dict()
+        # Ops queued from here on must reach the peer after the snapshot,
+        # so the tx thread holds them until the snapshot worker is done.
+        self._tx_queue.put(("hold", None, [peer["addr"]]))
+        crdt_dict = self.crdt.to_dict(buckets, since)
         print(
             f"[CRDT] SNAPSHOT SEND to {peer['name']}: {len(crdt_dict.get('nodes', []))} nodes"
         )
@@ -803,50 +1438,63 @@ class ConcurrentTextEditor(BaseTextEditor):
             "from_id": self.client_id,
             "from_name": self.user_name,
             "crdt_state": crdt_dict,
+            "partial": buckets is not None or since is not None,
         }
 
-        payload = json.dumps(msg).encode("utf-8")
+        self._snapshot_pool.submit(self._encode_and_send_snapshot, msg, peer["addr"])
+
+    def _encode_and_send_snapshot(self, msg, addr):
+        """Send a snapshot, then release the ops held back behind it (snapshot worker)."""
+        try:
+            self._encode_and_send(msg, addr)
+        finally:
+            self._tx_queue.put(("release", None, [addr]))
+
+    def _encode_and_send(self, msg, addr):
+        """Encode, compress and send a large message (runs on the snapshot worker)."""
+        try:
+            payload = encode_message(msg)
+
+            payload = zlib.compress(payload, SNAPSHOT_ZLIB_LEVEL)
 
-        payload = gzip.compress(payload)
+            self._send_udp_payload(payload, addr)
+        except Exception as e:
+            print(f"[CRDT] {msg.get('type')} send error: {e}")
 
-        self._send_udp_payload(payload, peer["ip"], peer["port"])
+    def _send_udp_payload(self, payload, addr):
+        """
+        Queue data for sending via UDP, fragmenting if necessary.
 
-    def _send_udp_payload(self, payload, ip, port):
-        """Send data via UDP, fragmenting if necessary."""
+        Chunks are handed to the tx thread one by one, 2 ms apart, so a
+        large snapshot does not overrun the receiver's socket buffer.
+        """
         MAX_SIZE = 32000
 
         if len(payload) <= MAX_SIZE:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                sock.sendto(payload, (ip, port))
+            self._tx_queue.put(("raw", [payload], [addr]))
         else:
             msg_id = str(uuid.uuid4())
             total_chunks = (len(payload) + MAX_SIZE - 1) // MAX_SIZE
 
             print(
-                f"[CHUNK] Splitting {len(payload)} bytes into {total_chunks} chunks for {ip}"
+                f"[CHUNK] Splitting {len(payload)} bytes into {total_chunks} chunks for {addr[0]}"
             )
 
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                for i in range(total_chunks):
-                    chunk = payload[i * MAX_SIZE : (i + 1) * MAX_SIZE]
-                    chunk_b64 = base64.b64encode(chunk).decode("ascii")
-
-                    packet = {
-                        "type": "CHUNK",
-                        "id": msg_id,
-                        "i": i,
-                        "n": total_chunks,
-                        "data": chunk_b64,
-                        "from_id": self.client_id,
-                    }
-
-                    packet_bytes = json.dumps(packet).encode("utf-8")
-                    try:
-                        sock.sendto(packet_bytes, (ip, port))
+            for i in range(total_chunks):
+                chunk = payload[i * MAX_SIZE : (i + 1) * MAX_SIZE]
 
-                        time.sleep(0.002)
-                    except OSError as e:
-                        print(f"[CHUNK] Send error: {e}")
+                packet = {
+                    "type": "CHUNK",
+                    "id": msg_id,
+                    "i": i,
+                    "n": total_chunks,
+                    "data": chunk,
+                    "from_id": self.client_id,
+                }
+
+                self._tx_queue.put(("raw", [encode_message(packet)], [addr]))
+
+                time.sleep(0.002)
 
     def _prompt_unsaved_before_join(self):
         msg = QMessageBox(self)
@@ -872,10 +1520,22 @@ class ConcurrentTextEditor(BaseTextEditor):
             return "discard"
         return "cancel"
 
+    def closeEvent(self, event):
+        """Stop the tx thread and release the shared UDP send socket."""
+        self._flush_insert_run()
+        self._snapshot_pool.shutdown(wait=False, cancel_futures=True)
+        self._tx_queue.put(None)
+        self._tx_thread.join(timeout=1.0)
+        self._send_sock.close()
+        super().closeEvent(event)
+
     def eventFilter(self, obj, event):
         if obj is self.text and event.type() == event.Type.KeyPress:
             self._on_key(event)
             return True
+        if obj is self.text and event.type() == event.Type.InputMethod:
+            self._on_input_method(event)
+            return True
         return super().eventFilter(obj, event)
 
 class User:
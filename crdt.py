@@ -1,13 +1,42 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Set
+from array import array
+from itertools import compress
+from operator import attrgetter
+import bisect
+import hashlib
 
-CrdtId = Tuple[int, str]
+# A node id packs (Lamport counter, site) into one int: the counter sits above
+# a 32-bit site number, so plain int order equals (counter, site) order.
+CrdtId = int
 
-HEAD: CrdtId = (0, "HEAD")
+SITE_BITS = 32
+SITE_MASK = (1 << SITE_BITS) - 1
 
+HEAD: CrdtId = 0
 
-@dataclass
+# Nodes are grouped into hash buckets by Lamport counter (Merkle-style diff).
+BUCKET_SPAN = 1024
+
+
+def make_id(counter: int, site: int) -> CrdtId:
+    """Pack a Lamport counter and a site number into a node id."""
+    return (counter << SITE_BITS) | site
+
+
+def id_counter(node_id: CrdtId) -> int:
+    return node_id >> SITE_BITS
+
+
+def run_ids(first_id: CrdtId, length: int) -> range:
+    """Ids of the `length` characters of an insert run starting at `first_id`."""
+    step = 1 << SITE_BITS
+    return range(first_id, first_id + length * step, step)
+
+
+# Every node but HEAD holds exactly one character, so text offsets count nodes.
+@dataclass(slots=True)
 class Node:
     id: CrdtId
     after: CrdtId
@@ -15,112 +44,442 @@ class Node:
     deleted: bool = False
 
 
+_node_text = attrgetter("text")
+
+
 class RgaCrdt:
     def __init__(self):
         self.nodes: Dict[CrdtId, Node] = {
             HEAD: Node(id=HEAD, after=HEAD, text="", deleted=False)
         }
         self.children: Dict[CrdtId, List[CrdtId]] = {HEAD: []}
+        self.max_counter = 0
+        self.version = 0
+        # Version vector: highest Lamport counter seen per site.
+        self._seen: Dict[int, int] = {}
+        self._bucket_members: Dict[int, List[CrdtId]] = {}
+        self._bucket_digests: Dict[int, int] = {}
+        self._dirty_buckets: Set[int] = set()
+        self._hash = 0
+        # Document order of every node (tombstones included) with a parallel
+        # visibility flag. Single inserts and deletes patch it in place, so an
+        # edit's text offset is found with C-level scans instead of a tree
+        # walk; None after a bulk merge, rebuilt on next use.
+        self._seq: Optional[List[CrdtId]] = []
+        self._live = bytearray()
+        # Walk results are reused until the next effective insert/delete, and
+        # patched in place by edits made while they are current.
+        self._order_cache: Optional[List[Node]] = None
+        self._order_version = -1
+        self._render_cache: Optional[str] = None
+        self._render_version = -1
+        self._id_map_cache: Optional[array] = None
+        self._id_map_version = -1
+
+    def _track(self, node_id: CrdtId) -> None:
+        """Register a new node in its hash bucket."""
+        bucket = (node_id >> SITE_BITS) // BUCKET_SPAN
+        self._bucket_members.setdefault(bucket, []).append(node_id)
+        self._dirty_buckets.add(bucket)
+
+    def _see(self, node_id: CrdtId) -> None:
+        """Advance max_counter and the version vector past `node_id`."""
+        counter = node_id >> SITE_BITS
+        site = node_id & SITE_MASK
+        if counter > self.max_counter:
+            self.max_counter = counter
+        if counter > self._seen.get(site, 0):
+            self._seen[site] = counter
 
     def has(self, node_id: CrdtId) -> bool:
         return node_id in self.nodes
 
     def apply_insert(self, after: CrdtId, node_id: CrdtId, text: str) -> bool:
-        if self.nodes is None or after not in self.nodes:
+        nodes = self.nodes
+        if after not in nodes:
             return False
 
-        if node_id in self.nodes:
+        if node_id in nodes:
             return True
 
-        self.nodes[node_id] = Node(id=node_id, after=after, text=text, deleted=False)
+        nodes[node_id] = Node(node_id, after, text)
+        self._see(node_id)
+        self.version += 1
+        self._track(node_id)
+        self._place(after, [node_id], text)
+
+        # Siblings are kept in ascending id order; traversal visits them newest-first.
+        children = self.children
+        siblings = children.get(after)
+        if siblings:
+            bisect.insort(siblings, node_id)
+        else:
+            children[after] = [node_id]
+
+        children.setdefault(node_id, [])
+        return True
+
+    def apply_insert_run(self, after: CrdtId, first_id: CrdtId, text: str) -> bool:
+        """
+        Insert `text` as a chain of single-character nodes in one pass.
 
-        self.children.setdefault(after, []).append(node_id)
+        Character i gets the id of `first_id` with its counter advanced by i and is placed
+        after character i - 1; the first character is placed after `after`.
+        Nodes that already exist are skipped, so re-delivered runs are harmless.
+        """
+        nodes = self.nodes
+        children = self.children
+        if after not in nodes:
+            return False
 
-        self.children[after].sort(reverse=True)
+        members = self._bucket_members
+        dirty = self._dirty_buckets
+        insort = bisect.insort
+        step = 1 << SITE_BITS
+        prev = after
+        node_id = first_id
+        inserted = 0
+        for ch in text:
+            if node_id not in nodes:
+                nodes[node_id] = Node(node_id, prev, ch)
+                # Within a fresh run the parent is the previous, childless node.
+                siblings = children.get(prev)
+                if siblings:
+                    insort(siblings, node_id)
+                else:
+                    children[prev] = [node_id]
+                children.setdefault(node_id, [])
+                bucket = (node_id >> SITE_BITS) // BUCKET_SPAN
+                members.setdefault(bucket, []).append(node_id)
+                dirty.add(bucket)
+                inserted += 1
+            prev = node_id
+            node_id += step
 
-        self.children.setdefault(node_id, [])
+        if inserted:
+            self._see(prev)
+            self.version += inserted
+            if inserted == len(text):
+                self._place(after, list(run_ids(first_id, inserted)), text)
+            else:
+                self._seq = None
         return True
 
     def apply_delete(self, node_id: CrdtId) -> bool:
-        if node_id not in self.nodes:
+        node = self.nodes.get(node_id)
+        if node is None:
             return False
         if node_id == HEAD:
             return True
 
-        self.nodes[node_id].deleted = True
+        if not node.deleted:
+            node.deleted = True
+            self.version += 1
+            self._dirty_buckets.add((node_id >> SITE_BITS) // BUCKET_SPAN)
+            seq = self._seq
+            if seq is not None:
+                pos = seq.index(node_id)
+                self._live[pos] = 0
+                self._patch_caches(self.version - 1, self._live.count(1, 0, pos), 1, (), "")
         return True
 
-    def _visible_nodes_in_order(self) -> List[Node]:
-        out: List[Node] = []
+    def delete_visible_range(self, start: int, end: int) -> List[CrdtId]:
+        """
+        Tombstone the visible characters at text offsets [start, end).
+
+        Returns:
+            List[CrdtId]: Ids of the deleted nodes, in text order.
+        """
+        ids = self.visible_id_map()[start:end]
+        if not ids:
+            return []
+
+        nodes = self.nodes
+        dirty = self._dirty_buckets
+        for node_id in ids:
+            nodes[node_id].deleted = True
+            dirty.add((node_id >> SITE_BITS) // BUCKET_SPAN)
+        self.version += len(ids)
+
+        # The characters are adjacent in the text, so in document order they
+        # span one slice (with only tombstones between them).
+        seq = self._seq
+        if seq is not None:
+            first = seq.index(ids[0])
+            last = seq.index(ids[-1], first) + 1
+            self._live[first:last] = bytes(last - first)
+            self._patch_caches(self.version - len(ids), start, len(ids), (), "")
+        return list(ids)
 
-        stack: List[CrdtId] = [HEAD]
+    def _sequence(self) -> List[CrdtId]:
+        """Return the document order of all nodes, rebuilding it if needed."""
+        if self._seq is None:
+            seq: List[CrdtId] = []
+            seq_append = seq.append
+            children = self.children
+            children_get = children.get
+            # Ascending siblings pushed as-is pop in descending (RGA) order.
+            stack: List[CrdtId] = list(children_get(HEAD, ()))
+            push = stack.extend
+            pop = stack.pop
 
-        while stack:
-            parent_id = stack.pop()
+            while stack:
+                node_id = pop()
+                seq_append(node_id)
+                push(children_get(node_id, ()))
 
-            if parent_id != HEAD:
-                n = self.nodes[parent_id]
-                if not n.deleted:
-                    out.append(n)
+            nodes = self.nodes
+            self._live = bytearray(not nodes[node_id].deleted for node_id in seq)
+            self._seq = seq
+        return self._seq
 
-            children = self.children.get(parent_id, [])
+    def _place(self, after: CrdtId, new_ids: List[CrdtId], text: str) -> None:
+        """Insert a freshly added chain of nodes into the document order."""
+        seq = self._seq
+        if seq is None:
+            return
+        first_id = new_ids[0]
+        pos = 0 if after == HEAD else seq.index(after) + 1
+        # Newer siblings of the chain come first, with their subtrees. Nodes
+        # always have larger ids than their ancestors, so those are exactly
+        # the following nodes whose ids are above the chain's.
+        end = len(seq)
+        while pos < end and seq[pos] > first_id:
+            pos += 1
+        seq[pos:pos] = new_ids
+        live = self._live
+        offset = live.count(1, 0, pos)
+        live[pos:pos] = b"\x01" * len(new_ids)
+        self._patch_caches(self.version - len(new_ids), offset, 0, new_ids, text)
 
-            for child_id in reversed(children):
-                stack.append(child_id)
+    def _patch_caches(self, version, offset, removed, new_ids, text) -> None:
+        """
+        Replace `removed` characters at `offset` with `new_ids`/`text` in the
+        walk caches that were current at `version`, i.e. before the edit.
+        """
+        if self._order_version == version and self._order_cache is not None:
+            nodes = self.nodes
+            self._order_cache[offset : offset + removed] = [nodes[i] for i in new_ids]
+            self._order_version = self.version
+        if self._render_version == version and self._render_cache is not None:
+            cached = self._render_cache
+            self._render_cache = cached[:offset] + text + cached[offset + removed :]
+            self._render_version = self.version
+        if self._id_map_version == version and self._id_map_cache is not None:
+            self._id_map_cache[offset : offset + removed] = array("Q", new_ids)
+            self._id_map_version = self.version
 
+    def _visible_nodes_in_order(self) -> List[Node]:
+        if self._order_version == self.version and self._order_cache is not None:
+            return self._order_cache
+
+        seq = self._sequence()
+        out = list(compress(map(self.nodes.__getitem__, seq), self._live))
+
+        self._order_cache = out
+        self._order_version = self.version
         return out
 
     def render(self) -> str:
-        return "".join(n.text for n in self._visible_nodes_in_order())
+        if self._render_version != self.version or self._render_cache is None:
+            # map(attrgetter) keeps the per-node loop in C; join sizes the
+            # result from the list in one pass.
+            self._render_cache = "".join(list(map(_node_text, self._visible_nodes_in_order())))
+            self._render_version = self.version
+        return self._render_cache
+
+    def visible_id_map(self) -> array:
+        """
+        Return the node id of every visible character, in text order.
+
+        The array is shared and updated in place by later inserts/deletes;
+        callers must not modify it or rely on it staying unchanged.
+        """
+        if self._id_map_version != self.version or self._id_map_cache is None:
+            seq = self._sequence()
+            self._id_map_cache = array("Q", compress(seq, self._live))
+            self._id_map_version = self.version
+        return self._id_map_cache
+
+    def text_offset(self, node_id: CrdtId) -> int:
+        """
+        Return the text offset of a node, or -1 if it is unknown or HEAD.
 
-    def visible_id_map(self) -> List[CrdtId]:
-        mapping: List[CrdtId] = []
-        for n in self._visible_nodes_in_order():
-            for _ in n.text:
-                mapping.append(n.id)
-        return mapping
+        For a deleted node this is where its character used to be.
+        """
+        seq = self._sequence()
+        try:
+            pos = seq.index(node_id)
+        except ValueError:
+            return -1
+        return self._live.count(1, 0, pos)
+
+    def _refresh_buckets(self) -> None:
+        """Recompute the digests of buckets changed since the last call."""
+        for bucket in self._dirty_buckets:
+            h = hashlib.blake2b(digest_size=8)
+            for node_id in sorted(self._bucket_members[bucket]):
+                n = self.nodes[node_id]
+                h.update(repr((n.id, n.after, n.text, n.deleted)).encode("utf-8"))
+            digest = int.from_bytes(h.digest(), "big")
+            self._hash ^= self._bucket_digests.get(bucket, 0) ^ digest
+            self._bucket_digests[bucket] = digest
+        self._dirty_buckets.clear()
+
+    def version_vector(self) -> Dict[int, int]:
+        """Return the highest Lamport counter seen per site."""
+        return dict(self._seen)
+
+    def bucket_digests(self) -> Dict[int, int]:
+        """Return a 64-bit digest per hash bucket (bucket = Lamport counter // BUCKET_SPAN)."""
+        self._refresh_buckets()
+        return dict(self._bucket_digests)
 
     def state_hash(self) -> int:
-        """Compute a hash of the visible text state."""
-        return hash(self.render())
+        """
+        Compute a hash of the CRDT state (all nodes and their tombstones).
+
+        The value is stable across processes and only re-hashes buckets
+        that changed since the previous call.
+        """
+        self._refresh_buckets()
+        return self._hash
+
+    def to_dict(self, buckets=None, since=None) -> dict:
+        """
+        Serialize CRDT state to a JSON-compatible dict.
 
-    def to_dict(self) -> dict:
-        """Serialize CRDT state to a JSON-compatible dict."""
-        nodes_list = []
+        Chains of single-character nodes from one site, each placed after the
+        previous one with the next counter (what apply_insert_run creates),
+        are written as one run entry whose "text" holds all the characters.
+        Runs never mix live and deleted nodes or cross a hash bucket.
+
+        Args:
+            buckets: Optional collection of bucket numbers. When given, only
+                the nodes in those buckets are serialized (HEAD is omitted).
+            since: Optional version vector {site: counter} of the receiver.
+                When given, live nodes it has already seen are skipped
+                (HEAD is omitted). Tombstones are always sent, since a
+                delete does not advance the vector.
+        """
+        partial = buckets is not None or since is not None
+        step = 1 << SITE_BITS
+        runs = []  # [first id, after, chars, deleted, bucket]
+        last_id = None
         for node in self.nodes.values():
-            nodes_list.append(
-                {
-                    "id": list(node.id),
-                    "after": list(node.after),
-                    "text": node.text,
-                    "deleted": node.deleted,
-                }
-            )
-        return {"nodes": nodes_list}
+            node_id = node.id
+            if partial and node_id == HEAD:
+                continue
+            bucket = (node_id >> SITE_BITS) // BUCKET_SPAN
+            if buckets is not None and bucket not in buckets:
+                continue
+            if (
+                since is not None
+                and not node.deleted
+                and node_id >> SITE_BITS <= since.get(node_id & SITE_MASK, 0)
+            ):
+                continue
+
+            run = runs[-1] if runs else None
+            if (
+                run is not None
+                and node.after == last_id
+                and node_id == last_id + step
+                and node.deleted == run[3]
+                and bucket == run[4]
+                and len(node.text) == 1
+                and len(run[2][0]) == 1
+            ):
+                run[2].append(node.text)
+            else:
+                runs.append([node_id, node.after, [node.text], node.deleted, bucket])
+            last_id = node_id
+
+        return {
+            "nodes": [
+                {"id": first_id, "after": after, "text": "".join(chars), "deleted": deleted}
+                for first_id, after, chars, deleted, _ in runs
+            ]
+        }
+
+    def merge_dict(self, data: dict) -> List[dict]:
+        """
+        Merge serialized nodes into this CRDT (union of nodes and tombstones).
+
+        Returns:
+            List[dict]: Run entries that could not be attached because
+            their parent is still unknown.
+        """
+        nodes = self.nodes
+        children = self.children
+        step = 1 << SITE_BITS
+        orphans = []
+        # A batch is cheaper to re-walk once than to place node by node.
+        self._seq = None
+        tombstones = []
+        touched = set()
+        inserted = 0
+
+        # Parents always have smaller ids than their children, so in id order
+        # every parent from the same batch is attached before its children.
+        for node_data in sorted(data.get("nodes", []), key=lambda d: d["id"]):
+            node_id = node_data["id"]
+            after_id = node_data["after"]
+            text = node_data["text"]
+            deleted = node_data["deleted"]
+            for i, ch in enumerate(text):
+                if node_id not in nodes:
+                    if after_id not in nodes:
+                        orphans.append(
+                            {"id": node_id, "after": after_id, "text": text[i:], "deleted": deleted}
+                        )
+                        break
+                    nodes[node_id] = Node(id=node_id, after=after_id, text=ch)
+                    children.setdefault(after_id, []).append(node_id)
+                    children.setdefault(node_id, [])
+                    touched.add(after_id)
+                    self._track(node_id)
+                    self._see(node_id)
+                    inserted += 1
+                if deleted:
+                    tombstones.append(node_id)
+                after_id = node_id
+                node_id += step
+
+        # Sibling lists are re-sorted once per batch rather than per insert.
+        for after_id in touched:
+            children[after_id].sort()
+        self.version += inserted
+
+        for node_id in tombstones:
+            self.apply_delete(node_id)
+        return orphans
 
     @classmethod
     def from_dict(cls, data: dict) -> "RgaCrdt":
-        """Deserialize CRDT state from a dict."""
+        """Deserialize CRDT state from a dict written by to_dict."""
         crdt = cls()
-        crdt.nodes = {}
-        crdt.children = {}
+        crdt._seq = None
+        nodes = crdt.nodes
+        children = crdt.children
+        step = 1 << SITE_BITS
 
         for node_data in data.get("nodes", []):
-            node_id = tuple(node_data["id"])
-            after_id = tuple(node_data["after"])
-            node = Node(
-                id=node_id,
-                after=after_id,
-                text=node_data["text"],
-                deleted=node_data["deleted"],
-            )
-            crdt.nodes[node_id] = node
-
-            if node_id != after_id:
-                crdt.children.setdefault(after_id, []).append(node_id)
-            crdt.children.setdefault(node_id, [])
-
-        for children_list in crdt.children.values():
-            children_list.sort(reverse=True)
+            node_id = node_data["id"]
+            if node_id == HEAD:
+                continue
+            after_id = node_data["after"]
+            deleted = node_data["deleted"]
+            for ch in node_data["text"]:
+                nodes[node_id] = Node(id=node_id, after=after_id, text=ch, deleted=deleted)
+                crdt._track(node_id)
+                crdt._see(node_id)
+                children.setdefault(after_id, []).append(node_id)
+                children.setdefault(node_id, [])
+                after_id = node_id
+                node_id += step
+
+        for children_list in children.values():
+            children_list.sort()
 
         return crdt
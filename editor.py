@@ -2,14 +2,82 @@ from PyQt6.QtWidgets import (
     QWidget,
     QVBoxLayout,
     QHBoxLayout,
-    QTextEdit,
+    QPlainTextEdit,
     QPushButton,
     QFileDialog,
     QMessageBox,
     QFontDialog,
-    QComboBox
+    QComboBox,
+    QApplication,
 )
+from PyQt6.QtCore import QEventLoop, Qt
+from PyQt6.QtGui import QTextCursor
+from contextlib import contextmanager
+import io
 import os
+import re
+
+# Keeps os.open from translating line endings on Windows.
+_O_BINARY = getattr(os, "O_BINARY", 0)
+
+# Buffer size for streaming a document to disk on save.
+WRITE_BUFFER_BYTES = 1 << 20
+
+# Characters inserted per step when loading a file into the editor.
+LOAD_CHUNK_CHARS = 65536
+
+# Filters offered by the Open and Save As dialogs.
+FILE_NAME_FILTERS = ("Text files (*.txt)", "All files (*)")
+
+
+def _read_text(path):
+    """
+    Read a UTF-8 text file with one buffer and one decode.
+
+    Line endings are normalized to "\n", as text-mode open() would.
+    """
+    fd = os.open(path, os.O_RDONLY | _O_BINARY)
+    try:
+        size = os.fstat(fd).st_size
+        chunks = []
+        while True:
+            chunk = os.read(fd, max(size, 1 << 16))
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    content = b"".join(chunks).decode("utf-8")
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+def _write_document(path, doc):
+    """
+    Write a QTextDocument to `path` as UTF-8, one block at a time.
+
+    Blocks are encoded and streamed through a buffered writer, so the whole
+    document is never held as one Python string. The output matches
+    toPlainText(): line and paragraph separators become newlines (written
+    as os.linesep, as text-mode open() would) and non-breaking spaces
+    become spaces.
+    """
+    newline = os.linesep.encode("ascii")
+    with io.BufferedWriter(io.FileIO(path, "w"), buffer_size=WRITE_BUFFER_BYTES) as out:
+        block = doc.begin()
+        first = True
+        while block.isValid():
+            if not first:
+                out.write(newline)
+            first = False
+            text = block.text()
+            if "\u2028" in text or "\u00a0" in text:
+                text = text.replace("\u2028", "\n").replace("\u00a0", " ")
+            if os.linesep != "\n" and "\n" in text:
+                text = text.replace("\n", os.linesep)
+            out.write(text.encode("utf-8"))
+            block = block.next()
 
 
 class BaseTextEditor(QWidget):
@@ -23,8 +91,8 @@ class BaseTextEditor(QWidget):
     Attributes:
         current_file_path (str | None): Path of the currently open file.
         is_dirty (bool): Flag indicating if the text has been modified.
-        text (QTextEdit): Main text editing widget.
-        theme_state (int): Current theme state (0=light, 1=dark, 2=cream, 3=mint).
+        text (QPlainTextEdit): Main text editing widget.
+        theme_state (int): Index of the active theme in _THEMES (theme_combo order).
     """
 
     def __init__(self):
@@ -35,6 +103,10 @@ class BaseTextEditor(QWidget):
 
         self.current_file_path = None
         self.is_dirty = False
+        # File dialogs are built on first use and kept, keyed by accept mode.
+        self._file_dialogs = {}
+        # True while _load_text is filling the document.
+        self._loading = False
 
         #Layouts
         main_layout = QVBoxLayout()
@@ -43,12 +115,16 @@ class BaseTextEditor(QWidget):
         self.setLayout(main_layout)
 
         #buttons
-        toolbar_layout.addWidget(self._btn("Open", self.open_file))
-        toolbar_layout.addWidget(self._btn("Save", self.save_file))
-        toolbar_layout.addWidget(self._btn("Save as", self.saveas_file))
-        toolbar_layout.addWidget(self._btn("Share", self.share_file))
-        toolbar_layout.addWidget(self._btn("Disconnect", self.leave_session))
-        toolbar_layout.addWidget(self._btn("Change font", self.change_font))
+        buttons = (
+            ("Open", self.open_file),
+            ("Save", self.save_file),
+            ("Save as", self.saveas_file),
+            ("Share", self.share_file),
+            ("Disconnect", self.leave_session),
+            ("Change font", self.change_font),
+        )
+        for label, slot in buttons:
+            toolbar_layout.addWidget(self._btn(label, slot))
 
         #themes
         self.theme_combo = QComboBox()
@@ -64,19 +140,30 @@ class BaseTextEditor(QWidget):
         toolbar_layout.addWidget(self.theme_combo)
 
         #text editor
-        self.text = QTextEdit()
-        self.text.setAcceptRichText(False)
-        self.text.textChanged.connect(self._on_modified)
+        self.text = QPlainTextEdit()
+        # The widget keeps one document for its lifetime; setPlainText and
+        # clear() reuse it, so the wrapper and an edit cursor can be kept.
+        # The cursor is for one-shot edits that position it themselves.
+        self._doc = self.text.document()
+        self._cursor = QTextCursor(self._doc)
+        self._dirty_watch = False
+        self._watch_modifications(True)
         main_layout.addWidget(self.text)
 
         #theme initialisation
-        self.set_light_theme()
+        self.theme_state = None
+        self._install_theme_stylesheet()
+        self._apply_theme(0)
 
     #help methods
     def _btn(self, label, slot):
         """
         Create a toolbar button with the given label and callback.
 
+        Buttons and the editor both live in the GUI thread, so the click is
+        connected directly instead of leaving Qt to pick the connection type
+        on every emit.
+
         Args:
             label (str): Text displayed on the button.
             slot (callable): Function to be called when the button is clicked.
@@ -85,80 +172,52 @@ class BaseTextEditor(QWidget):
             QPushButton: Configured button instance.
         """
         btn = QPushButton(label)
-        btn.clicked.connect(slot)
+        btn.clicked.connect(slot, type=Qt.ConnectionType.DirectConnection)
         return btn
 
     #themes methods
-    def set_light_theme(self):
-        """
-        Apply the standard light theme.
+    # Stylesheets in theme_combo order. They are merged into one
+    # application-wide stylesheet (see _theme_stylesheet), gated on the
+    # editor's "theme" property, so Qt parses them once per process.
+    _THEME_STYLESHEET = None
 
-        Uses a bright background with dark text, suitable for daytime use
-        and general-purpose text editing.
+    _THEMES = (
+        # Standard Light: bright background with dark text for daytime use.
         """
-        self.setStyleSheet("""
             QWidget { background-color: #f9f9f9; color: #1e1e1e; }
-            QTextEdit { background-color: #ffffff; color: #000000; border: 1px solid #cccccc; }
+            QPlainTextEdit { background-color: #ffffff; color: #000000; border: 1px solid #cccccc; }
             QPushButton, QComboBox { background-color: #e0e0e0; color: #1e1e1e; border-radius: 4px; padding: 5px; }
             QPushButton:hover, QComboBox:hover { background-color: #d0d0d0; }
-        """)
-
-    def set_cream_theme(self):
-        """
-        Apply a warm cream-colored theme.
-
-        Designed to reduce eye strain during long writing sessions by using
-        softer background colors and lower contrast.
+        """,
+        # Warm Cream: softer background and lower contrast for long sessions.
         """
-        self.setStyleSheet("""
             QWidget { background-color: #fff8e7; color: #3b3b3b; }
-            QTextEdit { background-color: #fffdf4; color: #2b2b2b; border: 1px solid #e6dabe; }
+            QPlainTextEdit { background-color: #fffdf4; color: #2b2b2b; border: 1px solid #e6dabe; }
             QPushButton, QComboBox { background-color: #f0e6d2; color: #3b3b3b; border-radius: 4px; padding: 5px; }
             QPushButton:hover, QComboBox:hover { background-color: #e6dabe; }
-        """)
-
-    def set_dark_grey_theme(self):
+        """,
+        # Dark Grey: classic dark editor for low-light environments.
         """
-        Apply a classic dark grey theme.
-
-        Suitable for low-light environments and users who prefer a traditional
-        dark editor appearance.
-        """
-        self.setStyleSheet("""
             QWidget { background-color: #2b2b2b; color: #f0f0f0; }
-            QTextEdit { background-color: #3c3f41; color: #f0f0f0; border: 1px solid #555; }
+            QPlainTextEdit { background-color: #3c3f41; color: #f0f0f0; border: 1px solid #555; }
             QPushButton, QComboBox { background-color: #505357; color: #f0f0f0; border-radius: 4px; padding: 5px; }
             QPushButton:hover, QComboBox:hover { background-color: #606367; }
-        """)
-
-    def set_midnight_theme(self):
-        """
-        Apply a midnight blue theme.
-
-        Inspired by solarized and midnight-style color schemes, offering a calm,
-        cool-toned dark interface for extended focus.
+        """,
+        # Midnight Blue: calm, cool-toned dark interface for extended focus.
         """
-        self.setStyleSheet("""
             QWidget { background-color: #0f1f2c; color: #d0e0f0; }
-            QTextEdit { background-color: #162a3b; color: #e6f2ff; border: 1px solid #2a4d69; }
+            QPlainTextEdit { background-color: #162a3b; color: #e6f2ff; border: 1px solid #2a4d69; }
             QPushButton, QComboBox { background-color: #1c3b57; color: #d0e0f0; border-radius: 4px; padding: 5px; }
             QPushButton:hover, QComboBox:hover { background-color: #264d70; }
-        """)
-
-    def set_terminal_theme(self):
-        """
-        Apply a soft rose terminal-style theme.
-
-        Uses a dark background with muted rose-colored text, inspired by
-        retro terminals and modern dusk-style color palettes.
+        """,
+        # Terminal Rose: dark background with muted rose text, retro terminal style.
         """
-        self.setStyleSheet("""
             QWidget {
                 background-color: #141216;
                 color: #d8a1b5;
             }
 
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: #1a161c;
                 color: #e2b4c3;
                 border: 1px solid #3a2a34;
@@ -176,36 +235,74 @@ class BaseTextEditor(QWidget):
             QPushButton:hover, QComboBox:hover {
                 background-color: #2c2330;
             }
-        """)
-
-    def set_charcoal_theme(self):
+        """,
+        # Deep Charcoal: very dark, high-contrast interface with minimal distraction.
         """
-        Apply a deep charcoal theme.
-
-        Provides very high contrast and minimal distraction, optimized for
-        users who prefer an extremely dark interface.
-        """
-        self.setStyleSheet("""
             QWidget { background-color: #121212; color: #e0e0e0; }
-            QTextEdit { background-color: #1e1e1e; color: #ffffff; border: 1px solid #333; }
+            QPlainTextEdit { background-color: #1e1e1e; color: #ffffff; border: 1px solid #333; }
             QPushButton, QComboBox { background-color: #333333; color: #ffffff; border-radius: 4px; padding: 5px; }
             QPushButton:hover, QComboBox:hover { background-color: #444444; }
-        """)
+        """,
+    )
+
+    @classmethod
+    def _theme_stylesheet(cls):
+        """
+        Merge all themes into one stylesheet, each rule scoped to its theme.
+
+        Every selector `S` of theme `i` becomes `*[theme="i"] S`; the editor
+        window itself is matched by `*[theme="i"]` for QWidget rules.
+        """
+        rules = []
+        for index, sheet in enumerate(cls._THEMES):
+            scope = f'*[theme="{index}"]'
+            for selectors, body in re.findall(r"([^{}]+)\{([^}]*)\}", sheet):
+                scoped = []
+                for selector in selectors.split(","):
+                    selector = selector.strip()
+                    if selector == "QWidget":
+                        scoped.append(scope)
+                    scoped.append(f"{scope} {selector}")
+                rules.append(f"{', '.join(scoped)} {{{body}}}")
+        return "\n".join(rules)
+
+    def _install_theme_stylesheet(self):
+        """
+        Add the merged theme stylesheet to the application's, once.
+
+        The rules are appended, so a stylesheet set by a host application
+        that embeds the editor is kept.
+        """
+        app = QApplication.instance()
+        stylesheet = BaseTextEditor._THEME_STYLESHEET
+        if stylesheet is None:
+            stylesheet = BaseTextEditor._THEME_STYLESHEET = self._theme_stylesheet()
+        if app is None:
+            return
+        existing = app.styleSheet()
+        if stylesheet not in existing:
+            app.setStyleSheet(f"{existing}\n{stylesheet}" if existing else stylesheet)
+
+    def _apply_theme(self, index):
+        """
+        Apply the theme at `index` in _THEMES and remember it in theme_state.
+
+        Only the editor's "theme" property changes; the editor and its
+        children are re-polished so the matching rules of the application
+        stylesheet take effect. No stylesheet is parsed here.
+        """
+        if index == self.theme_state or not 0 <= index < len(self._THEMES):
+            return
+        self.theme_state = index
+        self.setProperty("theme", str(index))
+        style = self.style()
+        for widget in [self, *self.findChildren(QWidget)]:
+            style.unpolish(widget)
+            style.polish(widget)
 
     def switch_theme(self, index):
         """Switch theme based on the combo box index."""
-        if index == 0:
-            self.set_light_theme()
-        elif index == 1:
-            self.set_cream_theme()
-        elif index == 2:
-            self.set_dark_grey_theme()
-        elif index == 3:
-            self.set_midnight_theme()
-        elif index == 4:
-            self.set_terminal_theme()
-        elif index == 5:
-            self.set_charcoal_theme()
+        self._apply_theme(index)
 
     #editor methods
     def change_font(self):
@@ -216,26 +313,119 @@ class BaseTextEditor(QWidget):
         if ok:
             self.text.setFont(font)
 
+    def _watch_modifications(self, enabled):
+        """Connect or disconnect _on_modified from textChanged, if not already."""
+        if enabled == self._dirty_watch:
+            return
+        if enabled:
+            self.text.textChanged.connect(self._on_modified)
+        else:
+            self.text.textChanged.disconnect(self._on_modified)
+        self._dirty_watch = enabled
+
     def _on_modified(self):
-        """Mark the document as modified whenever text changes."""
+        """
+        Mark the document as modified on its first change.
+
+        The slot then disconnects itself until the document is clean again
+        (see _mark_clean), so later keystrokes cost no Python call.
+        """
         self.is_dirty = True
+        self._watch_modifications(False)
+
+    def _mark_clean(self):
+        """Clear the dirty flag and resume watching for modifications."""
+        self.is_dirty = False
+        self._watch_modifications(True)
+
+    def _ask_file_path(self, mode):
+        """
+        Ask for a file to open or save to, reusing one dialog per mode.
+
+        The dialog keeps its directory and selected filter between calls.
+
+        Args:
+            mode (QFileDialog.AcceptMode): AcceptOpen or AcceptSave.
+
+        Returns:
+            str: The chosen path, or "" if the dialog was cancelled.
+        """
+        dialog = self._file_dialogs.get(mode)
+        if dialog is None:
+            opening = mode == QFileDialog.AcceptMode.AcceptOpen
+            dialog = QFileDialog(self, "Open file" if opening else "Save file")
+            dialog.setAcceptMode(mode)
+            dialog.setFileMode(
+                QFileDialog.FileMode.ExistingFile if opening else QFileDialog.FileMode.AnyFile
+            )
+            dialog.setNameFilters(FILE_NAME_FILTERS)
+            self._file_dialogs[mode] = dialog
+        if not dialog.exec():
+            return ""
+        return dialog.selectedFiles()[0]
 
     def open_file(self):
         """
         Open a text file using a file dialog and load its content into the editor.
         Sets the window title and clears the dirty flag.
         """
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, "Open file", "", "Text files (*.txt);;All files (*)"
-        )
+        file_path = self._ask_file_path(QFileDialog.AcceptMode.AcceptOpen)
         if not file_path:
             return
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        self.text.setPlainText(content)
+        content = _read_text(file_path)
+        self._load_text(content)
         self.current_file_path = file_path
         self.setWindowTitle(f"Text editor - {file_path}")
-        self.is_dirty = False
+        self._mark_clean()
+
+    @contextmanager
+    def _no_undo(self):
+        """
+        Suspend undo recording for a programmatic change.
+
+        Disabling undo drops the existing undo and redo stacks, so nothing
+        can step back into the state that was replaced. The previous setting
+        is restored afterwards; if undo is already off this does nothing.
+        """
+        if not self._doc.isUndoRedoEnabled():
+            yield
+            return
+        self._doc.setUndoRedoEnabled(False)
+        try:
+            yield
+        finally:
+            self._doc.setUndoRedoEnabled(True)
+
+    def _load_text(self, content):
+        """
+        Replace the editor content with `content`, inserted in chunks.
+
+        Repaints are suspended and pending non-input events are processed
+        between chunks, so a large file does not freeze the window in one
+        long layout pass. User input is held back until loading finishes.
+        The load does not mark the document dirty and leaves no undo steps.
+        `_loading` is True meanwhile, so event-driven edits can wait for it.
+        """
+        watching = self._dirty_watch
+        self._watch_modifications(False)
+        self.text.setUpdatesEnabled(False)
+        self._loading = True
+        try:
+            with self._no_undo():
+                self.text.clear()
+                # A cursor of its own: the insertion point must carry over
+                # between chunks, whatever else moves the shared one.
+                cursor = QTextCursor(self._doc)
+                for start in range(0, len(content), LOAD_CHUNK_CHARS):
+                    cursor.insertText(content[start : start + LOAD_CHUNK_CHARS])
+                    QApplication.processEvents(
+                        QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents
+                    )
+        finally:
+            self._loading = False
+            self.text.setUpdatesEnabled(True)
+            self._watch_modifications(watching)
+        self.text.moveCursor(QTextCursor.MoveOperation.Start)
 
     def save_file(self):
         """
@@ -244,40 +434,38 @@ class BaseTextEditor(QWidget):
         """
         if not self.current_file_path:
             return self.saveas_file()
-        content = self.text.toPlainText()
-        with open(self.current_file_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        _write_document(self.current_file_path, self._doc)
         QMessageBox.information(self, "Saved", f"File saved:\n{self.current_file_path}")
-        self.is_dirty = False
+        self._mark_clean()
         self.setWindowTitle(f"Text editor - {self.current_file_path}")
 
     def saveas_file(self):
         """
         Open a Save As dialog and save the editor content to the selected path.
-        Verifies that the directory exists and shows an error if not.
+        Shows an error if the file cannot be written (e.g. the directory
+        does not exist).
         """
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "Save file", "", "Text files (*.txt);;All files (*)"
-        )
+        file_path = self._ask_file_path(QFileDialog.AcceptMode.AcceptSave)
         if not file_path:
             return
-        dir_name = os.path.dirname(file_path)
-        if dir_name and not os.path.exists(dir_name):
+        try:
+            _write_document(file_path, self._doc)
+        except FileNotFoundError:
             QMessageBox.critical(self, "Error", "Path does not exist!")
             return
+        except PermissionError as e:
+            QMessageBox.critical(self, "Error", f"Cannot write file:\n{e}")
+            return
         self.current_file_path = file_path
-        content = self.text.toPlainText()
-        with open(self.current_file_path, "w", encoding="utf-8") as f:
-            f.write(content)
         QMessageBox.information(
             self, "Saved", f"File saved as:\n{self.current_file_path}"
         )
-        self.is_dirty = False
+        self._mark_clean()
         self.setWindowTitle(f"Text editor - {self.current_file_path}")
 
     # def insert_test_text(self):
     #     """Insert sample text at the end of the editor."""
-    #     self.text.append("Hello world!")
+    #     self.text.appendPlainText("Hello world!")
 
     def share_file(self):
         """
@@ -4,6 +4,15 @@ from PyQt6.QtWidgets import QApplication
 import sys
 import os
 import ctypes
+import functools
+
+
+@functools.lru_cache(maxsize=1)
+def _app_icon():
+    """Load the window icon once, from icon/ next to the script or frozen executable."""
+    base = sys.executable if getattr(sys, "frozen", False) else os.path.abspath(__file__)
+    return QIcon(os.path.join(os.path.dirname(base), "icon", "icon_256.png"))
+
 
 def main():
     if sys.platform.startswith("win") and not getattr(sys, "frozen", False):
@@ -11,8 +20,9 @@ def main():
             "editor.concurrenttexteditor"
         )
 
-    app = QApplication(sys.argv)
-    app.setWindowIcon(QIcon(os.path.join("icon", "icon_256.png")))  # Path to the icon file
+    # Reuse an application that already exists in this process (e.g. when embedded).
+    app = QApplication.instance() or QApplication(sys.argv)
+    app.setWindowIcon(_app_icon())
     editor = ConcurrentTextEditor()
     editor.show()
     sys.exit(app.exec())
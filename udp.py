@@ -0,0 +1,129 @@
+import ctypes
+import functools
+import os
+import socket
+import struct
+import sys
+
+# Upper bound of datagrams handed to a single sendmmsg(2) call.
+SENDMMSG_BATCH = 64
+
+
+class _Iovec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_Iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", _MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+def _load_sendmmsg():
+    """Return libc's sendmmsg on Linux, or None where it is not available."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        fn = ctypes.CDLL(None, use_errno=True).sendmmsg
+    except (OSError, AttributeError):
+        return None
+    fn.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    fn.restype = ctypes.c_int
+    return fn
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+@functools.lru_cache(maxsize=256)
+def pack_sockaddr(addr):
+    """
+    Build a raw `struct sockaddr_in` for an (ip, port) tuple.
+
+    Results are cached, so each peer's address is packed once rather than
+    on every send.
+
+    Args:
+        addr (tuple): Numeric IPv4 address and port.
+
+    Returns:
+        bytes: 16-byte sockaddr_in (family in host order, port in network order).
+    """
+    ip, port = addr
+    return (
+        struct.pack("=H", socket.AF_INET)
+        + struct.pack("!H", port)
+        + socket.inet_aton(ip)
+        + bytes(8)
+    )
+
+
+def _sendmmsg_batch(sock, batch):
+    """Send up to SENDMMSG_BATCH datagrams with one syscall. Returns the count sent."""
+    count = len(batch)
+    msgs = (_MMsgHdr * count)()
+    iovs = (_Iovec * count)()
+    keep_alive = []
+
+    for i, (payload, addr) in enumerate(batch):
+        data = ctypes.c_char_p(payload)
+        name = ctypes.c_char_p(pack_sockaddr(addr))
+        keep_alive.append((data, name))
+
+        iovs[i].iov_base = ctypes.cast(data, ctypes.c_void_p)
+        iovs[i].iov_len = len(payload)
+
+        hdr = msgs[i].msg_hdr
+        hdr.msg_name = ctypes.cast(name, ctypes.c_void_p)
+        hdr.msg_namelen = 16
+        hdr.msg_iov = ctypes.pointer(iovs[i])
+        hdr.msg_iovlen = 1
+
+    sent = _sendmmsg(sock.fileno(), msgs, count, 0)
+    if sent < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return sent
+
+
+def send_datagrams(sock, datagrams):
+    """
+    Send a list of (payload, addr) datagrams over a UDP socket.
+
+    On Linux the datagrams go out through sendmmsg(2), up to SENDMMSG_BATCH
+    per syscall. Elsewhere, or if sendmmsg fails, the remaining datagrams
+    are sent one by one with sendto.
+
+    Args:
+        sock (socket.socket): UDP socket to send from.
+        datagrams (list): (payload bytes, (ip, port)) pairs, sent in order.
+    """
+    sent = 0
+    if _sendmmsg is not None:
+        try:
+            while sent < len(datagrams):
+                n = _sendmmsg_batch(sock, datagrams[sent : sent + SENDMMSG_BATCH])
+                if n <= 0:
+                    break
+                sent += n
+        except OSError as e:
+            print(f"[UDP] sendmmsg failed, falling back to sendto: {e}")
+
+    for payload, addr in datagrams[sent:]:
+        sock.sendto(payload, addr)